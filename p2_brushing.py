@@ -1,27 +1,50 @@
+import os
 import sys
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import argparse
 from matplotlib.widgets import RectangleSelector
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from PyQt6.QtWidgets import QApplication, QMainWindow, QComboBox, QLabel, QVBoxLayout, QWidget, QHBoxLayout, QSlider
+from PyQt6.QtWidgets import QApplication, QMainWindow, QComboBox, QLabel, QVBoxLayout, QWidget, QHBoxLayout, QSlider, QPushButton, QFileDialog
 from PyQt6.QtCore import Qt
+from p2_cache import FrameCache, print_stats
+from p2_data import load_table, PlotData, print_memory_report
+from p2_trace import TraceRecorder, replay_trace
+from p2_projections import Projections
+from p2_export import ExportWorker, export_selection, selection_mask, pick_columns
+from p2_colors import CategoricalColors
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Linked Brushing Bubble Charts Tool')
     parser.add_argument('-i','--input', type=str, required=True, help='Path to the CSV file containing data')
+    parser.add_argument('--cache-mb', type=float, default=64, help='Memory budget in MB for cached rendered frames')
+    parser.add_argument('--cache-stats', action='store_true', help='Print render cache hits/misses on exit')
+    parser.add_argument('--float32', action='store_true', help='Store float columns as float32 when their values have at most 6 significant digits, saves memory but tooltips and exports show those columns rounded to float32 precision')
+    parser.add_argument('--memory-report', action='store_true', help='Print per-column memory usage and peak RSS on exit')
+    parser.add_argument('--record', type=str, help='Record mouse/widget events to this trace file')
+    parser.add_argument('--replay', type=str, help='Replay a recorded trace offscreen and print handler latencies')
+    parser.add_argument('--replay-max-speed', action='store_true', help='Replay events back to back instead of at recorded speed')
+    parser.add_argument('--export', type=str, help='Write the brushed selection to this .csv/.parquet/.arrow file on exit (also the default for the export button)')
+    parser.add_argument('--export-columns', type=str, help='Comma separated columns to export (default all)')
     return parser.parse_args()
 
 def main():
     args = parse_arguments()
     csv_path = args.input
-    df = pd.read_csv(csv_path)
+    df = load_table(csv_path, float32=args.float32)
     #separating numeric and categorical so it doesnt give errors in graph
-    numeric_columns = df.select_dtypes(include=[float, int]).columns.tolist()
-    categorical_columns = df.select_dtypes(exclude=[float, int]).columns.tolist()
+    numeric_columns = df.select_dtypes(include='number').columns.tolist()
+    categorical_columns = df.select_dtypes(exclude='number').columns.tolist()
+    projections = Projections(df, numeric_columns)  #PC1/PC2/PC3/z-composite as extra axis options
+    axis_columns = numeric_columns + projections.names()
+    data = PlotData(df, projections)  #filled/scaled/coded arrays are built once here and shared by every redraw
+    colors = CategoricalColors(data)  #palettes + legends for text columns, same category same color in both charts
 
     #overall layout
+    if args.replay:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')  #replays dont need a real screen
     app = QApplication(sys.argv)
+    cache = FrameCache(args.cache_mb)
     window = QMainWindow()
     window.setWindowTitle('Linked Brushing Bubble Charts')
     window.setGeometry(100, 100, 1800, 900)
@@ -37,9 +60,9 @@ def main():
     control_panel_layout = QHBoxLayout()
     chart1_layout = QVBoxLayout()
     x_select1 = QComboBox()
-    x_select1.addItems(numeric_columns)
+    x_select1.addItems(axis_columns)
     y_select1 = QComboBox()
-    y_select1.addItems(numeric_columns)
+    y_select1.addItems(axis_columns)
     color_select1 = QComboBox()
     color_select1.addItems(df.columns)
     size_select1 = QComboBox()
@@ -62,9 +85,9 @@ def main():
     chart1_layout.addWidget(scaling_slider1)
     chart2_layout = QVBoxLayout()
     x_select2 = QComboBox()
-    x_select2.addItems(numeric_columns)
+    x_select2.addItems(axis_columns)
     y_select2 = QComboBox()
-    y_select2.addItems(numeric_columns)
+    y_select2.addItems(axis_columns)
     color_select2 = QComboBox()
     color_select2.addItems(df.columns)
     size_select2 = QComboBox()
@@ -89,6 +112,8 @@ def main():
     control_panel_layout.addLayout(chart2_layout)
     layout.addLayout(charts_layout)
     layout.addLayout(control_panel_layout)
+    export_button = QPushButton('Export selection...')
+    layout.addWidget(export_button)
     widget.setLayout(layout)
     window.setCentralWidget(widget)
 
@@ -98,15 +123,28 @@ def main():
     scatter1 = scatter2 = None
     selected_indices = set()
 
-    def handle_categorical_column(column):
+    def color_encoding(column):
         if column in categorical_columns:
-            return pd.Categorical(df[column]).codes
-        return df[column]
+            return colors.scatter_kwargs(column)
+        return {'c': df[column], 'cmap': 'viridis'}
+
+    #numeric colors get the colorbar, text columns hide it and get their discrete legend instead
+    def update_colorbar(figure, ax, colorbar, scatter, color_attr):
+        if colorbar is None:
+            colorbar = figure.colorbar(scatter, ax=ax, label=color_attr)
+        if color_attr in categorical_columns:
+            colorbar.ax.set_visible(False)
+            colors.legend(ax, color_attr)
+        else:
+            colorbar.ax.set_visible(True)
+            colorbar.set_label(color_attr)
+            colorbar.update_normal(scatter)
+        return colorbar
 
     def add_size_legend(ax, size_attr, scale_factor, df):
-        size_values = pd.to_numeric(df[size_attr], errors='coerce').fillna(0)
-        small = size_values.quantile(0.25) #used this as it was easier here with so much code
-        medium = size_values.median()
+        size_values = data.numeric(size_attr)
+        small = np.quantile(size_values, 0.25) #used this as it was easier here with so much code
+        medium = np.median(size_values)
         big = size_values.max()
         #normalizing bubbles as values were tooooo large
         min_bubble_size = (small / size_values.max()) * scale_factor * 1000
@@ -126,27 +164,21 @@ def main():
                         color_select2.currentText(), size_select2.currentText(), scaling_slider1.value() / 1000, \
                         scaling_slider2.value() / 1000
 
-        def handle_numeric(attr, data):
-            return pd.to_numeric(data[attr], errors='coerce').fillna(0)
-        x1 = handle_numeric(x_attr1, df)
-        y1 = handle_numeric(y_attr1, df)
-        x2 = handle_numeric(x_attr2, df)
-        y2 = handle_numeric(y_attr2, df)
-        size1 = pd.to_numeric(df[size_attr1], errors='coerce').fillna(1)
-        size2 = pd.to_numeric(df[size_attr2], errors='coerce').fillna(1)
-        size1_scaled = (size1 - size1.min()) / (size1.max() - size1.min()) * scale_factor1 * 1000
-        size2_scaled = (size2 - size2.min()) / (size2.max() - size2.min()) * scale_factor2 * 1000
-        color1 = handle_categorical_column(color_attr1)
-        color2 = handle_categorical_column(color_attr2)
+        x1 = data.numeric(x_attr1)
+        y1 = data.numeric(y_attr1)
+        x2 = data.numeric(x_attr2)
+        y2 = data.numeric(y_attr2)
+        size1_scaled = data.sizes(size_attr1) * (scale_factor1 * 1000)
+        size2_scaled = data.sizes(size_attr2) * (scale_factor2 * 1000)
+        color1 = color_encoding(color_attr1)
+        color2 = color_encoding(color_attr2)
         ax1.clear()
-        scatter1 = ax1.scatter(x1, y1, s=size1_scaled, c=color1, cmap='viridis', alpha=1.0, edgecolors='w',
-                               linewidth=0.5)
+        scatter1 = ax1.scatter(x1, y1, s=size1_scaled, alpha=1.0, edgecolors='w', linewidth=0.5, **color1)
         ax1.set_xlabel(x_attr1)
         ax1.set_ylabel(y_attr1)
         ax1.set_title('Chart 1')
         ax2.clear()
-        scatter2 = ax2.scatter(x2, y2, s=size2_scaled, c=color2, cmap='viridis', alpha=1.0, edgecolors='w',
-                               linewidth=0.5)
+        scatter2 = ax2.scatter(x2, y2, s=size2_scaled, alpha=1.0, edgecolors='w', linewidth=0.5, **color2)
         ax2.set_xlabel(x_attr2)
         ax2.set_ylabel(y_attr2)
         ax2.set_title('Chart 2')
@@ -154,23 +186,14 @@ def main():
         add_size_legend(ax2, size_attr2, scale_factor2, df)
 
         # Update colorbars dynamically
-        if colorbar1 is None:
-            colorbar1 = figure1.colorbar(scatter1, ax=ax1, label=color_attr1)
-        else:
-            colorbar1.set_label(color_attr1)
-            colorbar1.update_normal(scatter1)
-        if colorbar2 is None:
-            colorbar2 = figure2.colorbar(scatter2, ax=ax2, label=color_attr2)
-        else:
-            colorbar2.set_label(color_attr2)
-            colorbar2.update_normal(scatter2)
-        canvas1.draw()
-        canvas2.draw()
-
-        highlight_selected()  #preserving the transparency state when updating
+        colorbar1 = update_colorbar(figure1, ax1, colorbar1, scatter1, color_attr1)
+        colorbar2 = update_colorbar(figure2, ax2, colorbar2, scatter2, color_attr2)
+        apply_selection_alpha()  #preserving the transparency state when updating
+        draw_chart(canvas1, rect_selector1, 'Chart 1', x_attr1, y_attr1, color_attr1, size_attr1, scale_factor1)
+        draw_chart(canvas2, rect_selector2, 'Chart 2', x_attr2, y_attr2, color_attr2, size_attr2, scale_factor2)
 
     #this function highlights sthe bubbles that i select using the rectangle box and the rest become transparent
-    def highlight_selected():
+    def apply_selection_alpha():
         global scatter1, scatter2
         if selected_indices:
             alphas1 = [1.0 if i in selected_indices else 0.2 for i in range(len(df))]
@@ -181,10 +204,20 @@ def main():
             alphas2 = [1.0 for _ in range(len(df))]
         scatter1.set_alpha(alphas1)
         scatter2.set_alpha(alphas2)
+
+    def highlight_selected():
+        apply_selection_alpha()
         # redrawaing once its done
         canvas1.draw()
         canvas2.draw()
 
+    #draws a chart, plain (unbrushed) charts come from the frame cache if that encoding was drawn before
+    def draw_chart(canvas, rect_selector, *encoding):
+        if selected_indices:
+            canvas.draw()  #selection alpha changes too often to be worth caching
+        elif cache.draw(canvas, cache.key(canvas, *encoding)):
+            rect_selector.update_background(None)  #no draw_event on a cache hit so refresh the selector blit background
+
     # this resets once im done selecting
     def reset_selection(event):
         global selected_indices
@@ -199,20 +232,20 @@ def main():
             x_min, x_max = sorted([eclick.xdata, erelease.xdata])
             y_min, y_max = sorted([eclick.ydata, erelease.ydata])
 
-            for i in range(len(df)): #itterate through all data points to see which ones fall within the selection rectangle
-                x_value = df.iloc[i][x_select1.currentText()]
-                y_value = df.iloc[i][y_select1.currentText()]
-                if x_min <= x_value <= x_max and y_min <= y_value <= y_max:
-                    selected_indices.add(i)
+            #checks all points at once against the selection rectangle (raw values so missing ones never match)
+            x_values = data.raw(x_select1.currentText())
+            y_values = data.raw(y_select1.currentText())
+            inside = (x_values >= x_min) & (x_values <= x_max) & (y_values >= y_min) & (y_values <= y_max)
+            selected_indices.update(np.flatnonzero(inside).tolist())
         elif chart == 'right': #same for right
             x_min, x_max = sorted([eclick.xdata, erelease.xdata])
             y_min, y_max = sorted([eclick.ydata, erelease.ydata])
 
-            for i in range(len(df)):
-                x_value = df.iloc[i][x_select2.currentText()]
-                y_value = df.iloc[i][y_select2.currentText()]
-                if x_min <= x_value <= x_max and y_min <= y_value <= y_max:
-                    selected_indices.add(i)
+            #checks all points at once against the selection rectangle (raw values so missing ones never match)
+            x_values = data.raw(x_select2.currentText())
+            y_values = data.raw(y_select2.currentText())
+            inside = (x_values >= x_min) & (x_values <= x_max) & (y_values >= y_min) & (y_values <= y_max)
+            selected_indices.update(np.flatnonzero(inside).tolist())
 
         highlight_selected() #update the charts to reflect the selection by highlighting selected points
 
@@ -227,6 +260,32 @@ def main():
         rect_selector1.set_active(True)
         rect_selector2.set_active(True)
 
+    #exporting the brushed countries, runs in the background so big selections dont freeze the window
+    export_columns = args.export_columns.split(',') if args.export_columns else None
+    export_worker = ExportWorker()
+    export_worker.finished.connect(window.statusBar().showMessage)
+
+    def export_clicked():
+        nonlocal export_columns
+        if not selected_indices:
+            window.statusBar().showMessage('Nothing selected, brush some countries first')
+            return
+        path, _ = QFileDialog.getSaveFileName(window, 'Export selection', args.export or 'selection.csv',
+                                              'CSV (*.csv);;Parquet (*.parquet);;Arrow IPC (*.arrow)')
+        if not path:
+            return
+        columns = pick_columns(window, list(df.columns), export_columns)  #starts from --export-columns / the last pick
+        if columns is None:
+            return
+        if not columns:
+            window.statusBar().showMessage('No columns picked, nothing exported')
+            return
+        export_columns = columns
+        window.statusBar().showMessage(f'Exporting {len(selected_indices):,} rows to {path}...')
+        export_worker.start(df, selection_mask(len(df), selected_indices), path, export_columns)
+
+    export_button.clicked.connect(export_clicked)
+
     #rectangle selector tool
     rect_selector1 = RectangleSelector(ax1, lambda eclick, erelease: on_select(eclick, erelease, 'left'), useblit=True, interactive=True)
     rect_selector2 = RectangleSelector(ax2, lambda eclick, erelease: on_select(eclick, erelease, 'right'), useblit=True, interactive=True)
@@ -244,8 +303,28 @@ def main():
     color_select2.currentIndexChanged.connect(update_plots)
     size_select2.currentIndexChanged.connect(update_plots)
     scaling_slider2.valueChanged.connect(update_plots)
+    #everything a trace can poke at, by name
+    targets = {'canvas1': canvas1, 'canvas2': canvas2,
+               'x_select1': x_select1, 'y_select1': y_select1, 'color_select1': color_select1,
+               'size_select1': size_select1, 'scaling_slider1': scaling_slider1,
+               'x_select2': x_select2, 'y_select2': y_select2, 'color_select2': color_select2,
+               'size_select2': size_select2, 'scaling_slider2': scaling_slider2}
+    recorder = TraceRecorder(targets) if args.record else None
     window.show()
-    sys.exit(app.exec())
+    if args.replay:
+        exit_code = replay_trace(args.replay, targets, app, max_speed=args.replay_max_speed)
+    else:
+        exit_code = app.exec()
+    if recorder:
+        recorder.save(args.record)
+    if args.export:
+        count = export_selection(df, selection_mask(len(df), selected_indices), args.export, export_columns)
+        print(f"exported {count:,} rows to {args.export}")
+    if args.cache_stats:
+        print_stats(cache)
+    if args.memory_report:
+        print_memory_report(df, data)
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+
+# keeps rendered canvas pixels around so flipping back to an encoding we already drew
+# doesnt need a whole agg render again. evicts the least recently used frames once the
+# memory budget is used up
+class FrameCache:
+    def __init__(self, budget_mb=64):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.frames = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    # encoding is whatever the script picks (attrs, scale factor...), canvas size is
+    # added here since a frame is only valid for the size it was drawn at
+    def key(self, canvas, *encoding):
+        width, height = canvas.get_width_height(physical=True)
+        return encoding + (width, height)
+
+    def get(self, key):
+        frame = self.frames.get(key)
+        if frame is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.frames.move_to_end(key)
+        return frame[0]
+
+    def put(self, key, canvas):
+        width, height = canvas.get_width_height(physical=True)
+        nbytes = width * height * 4  # rgba buffer
+        if nbytes > self.budget:
+            return
+        if key in self.frames:
+            self.used -= self.frames.pop(key)[1]
+        while self.frames and self.used + nbytes > self.budget:
+            self.used -= self.frames.popitem(last=False)[1][1]
+        self.frames[key] = (canvas.copy_from_bbox(canvas.figure.bbox), nbytes)
+        self.used += nbytes
+
+    # draws the canvas from cache if we have the frame, otherwise renders it and stores it
+    # artists have to be set up already either way so hover/resize redraws stay correct
+    def draw(self, canvas, key):
+        frame = self.get(key)
+        if frame is None:
+            canvas.draw()
+            self.put(key, canvas)
+            return False
+        canvas.restore_region(frame)
+        canvas.blit(canvas.figure.bbox)
+        return True
+
+    def clear(self):
+        self.frames.clear()
+        self.used = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'frames': len(self.frames),
+                'used_mb': self.used / (1024 * 1024), 'budget_mb': self.budget / (1024 * 1024)}
+
+
+def print_stats(cache):
+    stats = cache.stats()
+    print(f"render cache: {stats['hits']} hits, {stats['misses']} misses, {stats['frames']} frames, "
+          f"{stats['used_mb']:.1f}/{stats['budget_mb']:.1f} MB")
@@ -0,0 +1,75 @@
+import numpy as np
+import matplotlib
+from matplotlib.colors import ListedColormap
+from matplotlib.legend import Legend
+from matplotlib.patches import Patch
+
+# colors for text columns (region, name...). every column gets its code array and a fixed palette
+# once, so the same category is always the same color in both charts and a redraw only passes the
+# cached arrays to scatter. columns with more categories than fit in the palette (name) keep the
+# most common ones and put the rest into "other", that way the legend never gets huge
+MAX_CATEGORIES = 20
+OTHER_COLOR = (0.75, 0.75, 0.75, 1.0)
+LABEL_LENGTH = 22
+
+
+class CategoricalColors:
+    def __init__(self, data, max_categories=MAX_CATEGORIES):
+        self.data = data
+        self.max_categories = max_categories
+        self.encodings = {}  # column -> (palette codes, colormap, labels)
+        self.legends = {}    # (axes, column) -> Legend, re-added after every ax.clear()
+
+    def encoding(self, column):
+        encoding = self.encodings.get(column)
+        if encoding is not None:
+            return encoding
+        codes = self.data.codes(column)
+        categories = self.data.categories(column)
+        counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+        if len(categories) <= self.max_categories:
+            keep = np.arange(len(categories))
+        else:
+            #most common first, but only categories that are more common than everything that gets
+            #dropped. when counts tie (every name shows up once) there is no top-k, it all goes in other
+            order = np.argsort(-counts, kind='stable')
+            top = order[:self.max_categories - 1]
+            keep = np.sort(top[counts[top] > counts[order[self.max_categories - 1]]])
+        dropped = len(categories) - len(keep)
+        missing = int((codes < 0).sum())
+        has_other = dropped > 0 or missing > 0
+        # remap[-1] is "other" so missing values (code -1) land there too
+        remap = np.full(len(categories) + 1, len(keep), dtype=np.int16)
+        remap[keep] = np.arange(len(keep))
+        palette_codes = remap[codes]
+        base = matplotlib.colormaps['tab10' if len(keep) <= 10 else 'tab20']
+        palette = [base(i) for i in range(len(keep))] + ([OTHER_COLOR] if has_other else [])
+        labels = [shorten(str(categories[i])) for i in keep] + ([other_label(dropped, missing)] if has_other else [])
+        encoding = (palette_codes, ListedColormap(palette), labels)
+        self.encodings[column] = encoding
+        return encoding
+
+    def scatter_kwargs(self, column):
+        palette_codes, cmap, labels = self.encoding(column)
+        return {'c': palette_codes, 'cmap': cmap, 'vmin': -0.5, 'vmax': len(labels) - 0.5}
+
+    # discrete legend for the column, built the first time and just put back on the axes after that
+    def legend(self, ax, column):
+        legend = self.legends.get((ax, column))
+        if legend is None:
+            _, cmap, labels = self.encoding(column)
+            handles = [Patch(facecolor=cmap(i), edgecolor='w') for i in range(len(labels))]
+            legend = Legend(ax, handles, labels, title=column, loc='lower right', fontsize=8, title_fontsize=9,
+                            ncols=1 if len(labels) <= 10 else 2, framealpha=0.8)
+            self.legends[(ax, column)] = legend
+        ax.add_artist(legend)
+        return legend
+
+
+def other_label(dropped, missing):
+    parts = ([f'{dropped} categories'] if dropped else []) + ([f'{missing} missing'] if missing else [])
+    return f"other ({', '.join(parts)})"
+
+
+def shorten(label):
+    return label if len(label) <= LABEL_LENGTH else label[:LABEL_LENGTH - 1] + '…'
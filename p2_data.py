@@ -0,0 +1,216 @@
+import sys
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # only needed for the arrow backed string columns
+    pa = None
+
+CHUNK_ROWS = 100_000
+CATEGORY_LIMIT = 65536  #stop counting distinct values past this, the column is a plain string column then
+INT32 = np.iinfo(np.int32)
+
+
+# loads the csv into a compact table instead of the default object/float64 everything
+# - numbers with thousands separators ("13,513") get parsed as numbers right away
+# - integer columns stay integers, int32 where the values fit
+# - low cardinality text (region) becomes a categorical, high cardinality text (name) goes into
+#   arrow string buffers if pyarrow is there, otherwise the python strings are interned
+# - float32=True stores float columns as float32 when every value has at most 6 significant digits,
+#   which float32 always keeps (4.48 does, 1413142846.0 doesnt so population stays float64)
+# the file is read in chunks twice: the first pass only looks at what each column holds (so a
+# sparse column that is empty for a while still gets the right type), the second pass reads with
+# those dtypes and converts every chunk straight away, so the full float64/python string version
+# of the table never exists (that was what set the peak memory before)
+def load_table(path, float32=False):
+    stats = scan_columns(path, float32)
+    dtypes = {column: column_dtype(stat, float32) for column, stat in stats.items()}
+    read_dtypes = {column: 'str' if dtype == 'category' else dtype for column, dtype in dtypes.items() if dtype}
+    parts = {column: [] for column in stats}
+    for chunk in pd.read_csv(path, thousands=',', chunksize=CHUNK_ROWS, dtype=read_dtypes):
+        for column in stats:
+            parts[column].append(convert_chunk(chunk[column], dtypes[column]))
+        del chunk
+    columns = {}
+    for column in stats:
+        columns[column] = combine_chunks(parts.pop(column), dtypes[column])  #pop so each column's chunks are freed right after
+    return pd.DataFrame(columns, copy=False)
+
+
+# first pass: per column, whether it ever holds text, the integer range, whether float32 is lossless
+# and roughly how many distinct values the text has
+def scan_columns(path, float32=False):
+    stats = {}
+    rows = 0
+    for chunk in pd.read_csv(path, thousands=',', chunksize=CHUNK_ROWS):
+        rows += len(chunk)
+        for column in chunk.columns:
+            stat = stats.setdefault(column, {'text': False, 'int': True, 'other': False, 'lo': 0, 'hi': 0,
+                                             'float32': float32, 'seen': set()})
+            values = chunk[column]
+            if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):  #newer pandas reads text as str not object
+                if values.notna().any():
+                    stat['text'] = True
+                    if stat['seen'] is not None:
+                        stat['seen'].update(values.dropna().unique())
+                        if len(stat['seen']) > CATEGORY_LIMIT:
+                            stat['seen'] = None
+                else:
+                    stat['int'] = False  #empty for this whole chunk, so missing values -> not an int column
+            elif values.dtype.kind in 'iu' and len(values):
+                stat['lo'], stat['hi'] = min(stat['lo'], values.min()), max(stat['hi'], values.max())
+            elif values.dtype.kind == 'f':
+                stat['int'] = False
+                if stat['float32']:
+                    stat['float32'] = fits_float32(values.to_numpy())
+            else:
+                stat['other'] = True  #bools and anything else, left to the parser
+    for stat in stats.values():
+        stat['rows'] = rows
+    return stats
+
+
+# float32 keeps 6 significant decimal digits exactly, so values with no more than that survive
+def fits_float32(numbers):
+    numbers = numbers[np.isfinite(numbers) & (numbers != 0)]
+    scale = 10.0 ** (5 - np.floor(np.log10(np.abs(numbers))))
+    return bool(np.allclose(np.round(numbers * scale) / scale, numbers, rtol=1e-12, atol=0))
+
+
+def column_dtype(stat, float32):
+    if stat['text']:
+        if stat['seen'] is not None and len(stat['seen']) <= stat['rows'] // 2:
+            return 'category'
+        return 'str'
+    if stat['other']:
+        return None
+    if stat['int']:
+        return 'int32' if INT32.min <= stat['lo'] and stat['hi'] <= INT32.max else 'int64'
+    return 'float32' if float32 and stat['float32'] else 'float64'
+
+
+def convert_chunk(values, dtype):
+    if dtype == 'category':
+        return pd.Categorical(values)
+    if dtype == 'str':
+        if pa is not None:
+            return pa.array(values, from_pandas=True).cast(pa.large_string())
+        return np.array([sys.intern(v) if isinstance(v, str) else v for v in values], dtype=object)
+    return values.to_numpy(copy=True)  #a view would keep the whole chunk block alive until the end
+
+
+def combine_chunks(parts, dtype):
+    if dtype == 'category':
+        return pd.api.types.union_categoricals(parts, sort_categories=True)
+    if dtype == 'str' and pa is not None:
+        return pd.arrays.ArrowStringArray(pa.chunked_array(parts, type=pa.large_string()))
+    return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+
+# column as a float array, float columns come back as-is (no copy, keeps float32)
+def as_float(values):
+    if values.dtype.kind == 'f':
+        return values.to_numpy()
+    return values.to_numpy(dtype=float, na_value=np.nan)
+
+
+# derived plotting arrays, built once per column and reused by every redraw instead of
+# coercing/filling/scaling a fresh copy of the column each time
+class PlotData:
+    def __init__(self, df, projections=None):
+        self.df = df
+        self.projections = projections  #p2_projections.Projections, adds PC1/PC2/.. as columns
+        self.filled = {}
+        self.scaled = {}
+        self.category_codes = {}
+
+    def is_projection(self, column):
+        return self.projections is not None and column in self.projections.names()
+
+    # float values of a column or projection, missing values left as NaN
+    def raw(self, column):
+        if self.is_projection(column):
+            return self.projections.get(column)
+        return as_float(self.df[column])
+
+    # numeric column with missing values as 0 (what the charts plotted before)
+    def numeric(self, column):
+        if self.is_projection(column):
+            return self.projections.get(column)  #already has no NaNs
+        values = self.filled.get(column)
+        if values is None:
+            values = np.nan_to_num(as_float(self.df[column]), nan=0.0)
+            self.filled[column] = values
+        return values
+
+    # bubble sizes normalized to 0-1, multiply by the scaling factor when drawing
+    # fill=None keeps missing values as NaN so those bubbles just dont get drawn
+    def sizes(self, column, fill=1):
+        key = (column, fill)
+        values = self.scaled.get(key)
+        if values is None:
+            values = self.raw(column)
+            if fill is not None:
+                values = np.where(np.isnan(values), fill, values)
+            small, big = np.nanmin(values), np.nanmax(values)
+            values = (values - small) / ((big - small) or 1)
+            self.scaled[key] = values
+        return values
+
+    # category codes (-1 for missing) and the categories they point at, built once per column
+    def encoded(self, column):
+        encoded = self.category_codes.get(column)
+        if encoded is None:
+            column_values = self.df[column]
+            if isinstance(column_values.dtype, pd.CategoricalDtype):
+                encoded = (column_values.cat.codes.to_numpy(), column_values.cat.categories)
+            else:
+                categorical = pd.Categorical(column_values)
+                encoded = (categorical.codes, categorical.categories)
+            self.category_codes[column] = encoded
+        return encoded
+
+    def codes(self, column):
+        return self.encoded(column)[0]
+
+    def categories(self, column):
+        return self.encoded(column)[1]
+
+    # call after the values of some columns changed, only those get rebuilt
+    def invalidate(self, columns):
+        for column in columns:
+            self.filled.pop(column, None)
+            self.category_codes.pop(column, None)
+        self.scaled = {key: value for key, value in self.scaled.items() if key[0] not in columns}
+        if self.projections is not None:
+            self.projections.invalidate(columns)
+
+    # includes the projection caches (z-scores and PC/z-composite arrays) when there are projections
+    def nbytes(self):
+        return (sum(v.nbytes for cache in (self.filled, self.scaled) for v in cache.values())
+                + sum(codes.nbytes for codes, _ in self.category_codes.values())
+                + (self.projections.nbytes() if self.projections is not None else 0))
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # bytes on mac, kb on linux
+
+
+def print_memory_report(df, data=None):
+    usage = df.memory_usage(deep=True, index=False)
+    width = max(len(str(column)) for column in df.columns)
+    print(f"{'column':<{width}}  {'dtype':<16}{'bytes':>14}")
+    for column in df.columns:
+        print(f"{column:<{width}}  {str(df[column].dtype):<16}{usage[column]:>14,}")
+    print(f"{'total':<{width}}  {'':<16}{usage.sum():>14,}")
+    if data is not None:
+        print(f"{'derived arrays':<{width}}  {'':<16}{data.nbytes():>14,}")
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"peak RSS: {peak:.1f} MB")
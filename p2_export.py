@@ -0,0 +1,145 @@
+import csv
+import os
+import threading
+import numpy as np
+import pandas as pd
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtWidgets import QDialog, QDialogButtonBox, QListWidget, QListWidgetItem, QVBoxLayout
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # only parquet/arrow exports need it, csv works without
+    pa = None
+
+# writes the brushed rows out in chunks straight from the column arrays, so a big selection
+# never turns into a second DataFrame in memory
+CHUNK_ROWS = 65536
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.ipc': 'arrow', '.feather': 'arrow'}
+
+
+def export_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Can't export to '{path}', use one of {', '.join(FORMATS)}")
+    return FORMATS[extension]
+
+
+def selection_mask(n_rows, selected_indices):
+    mask = np.zeros(n_rows, dtype=bool)
+    mask[list(selected_indices)] = True
+    return mask
+
+
+# slice of one column for the given row positions, numpy backed columns are indexed directly
+# and the rest (categoricals, arrow strings) use their own take so they keep their type
+def take(series, rows):
+    if isinstance(series.dtype, np.dtype):
+        return series.to_numpy()[rows]
+    return series.array.take(rows)
+
+
+def chunks(df, mask, columns):
+    rows = np.flatnonzero(mask)
+    for start in range(0, len(rows), CHUNK_ROWS):
+        chunk_rows = rows[start:start + CHUNK_ROWS]
+        yield [take(df[column], chunk_rows) for column in columns]
+
+
+def write_csv(path, df, mask, columns):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for arrays in chunks(df, mask, columns):
+            writer.writerows(zip(*(csv_values(values) for values in arrays)))
+
+
+# missing values are written as empty fields, same as pandas to_csv. floats are turned into text by
+# numpy in their own precision, going through python floats would print float32 4.48 as 4.480000019073486
+def csv_values(values):
+    missing = pd.isna(values)
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+        values = values.astype(str).astype(object)
+    else:
+        values = np.asarray(values, dtype=object)
+    values[missing] = None
+    return values
+
+
+def write_arrow(path, df, mask, columns, fmt):
+    if pa is None:
+        raise ImportError(f"Exporting to {fmt} needs pyarrow (pip install pyarrow)")
+    writer = None
+    try:
+        for arrays in chunks(df, mask, columns):
+            batch = pa.RecordBatch.from_arrays([pa.array(values, from_pandas=True) for values in arrays], names=columns)
+            if writer is None:
+                if fmt == 'parquet':
+                    writer = pa.parquet.ParquetWriter(path, batch.schema)
+                else:
+                    writer = pa.ipc.new_file(path, batch.schema)
+            if fmt == 'parquet':
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+        if writer is None:  # empty selection, still write a file with the right columns
+            schema = pa.schema([(column, pa.array(take(df[column], np.empty(0, dtype=np.intp)), from_pandas=True).type) for column in columns])
+            writer = pa.parquet.ParquetWriter(path, schema) if fmt == 'parquet' else pa.ipc.new_file(path, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# writes the rows where mask is True, all columns unless a subset is given. returns number of rows
+def export_selection(df, mask, path, columns=None):
+    fmt = export_format(path)
+    columns = list(columns) if columns else list(df.columns)
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown columns for export: {', '.join(missing)}")
+    if fmt == 'csv':
+        write_csv(path, df, mask, columns)
+    else:
+        write_arrow(path, df, mask, columns, fmt)
+    return int(mask.sum())
+
+
+# small dialog with a checkbox per column, returns the checked ones or None if cancelled
+def pick_columns(parent, columns, checked=None):
+    dialog = QDialog(parent)
+    dialog.setWindowTitle('Columns to export')
+    layout = QVBoxLayout(dialog)
+    column_list = QListWidget()
+    for column in columns:
+        item = QListWidgetItem(column)
+        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+        item.setCheckState(Qt.CheckState.Checked if checked is None or column in checked else Qt.CheckState.Unchecked)
+        column_list.addItem(item)
+    buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+    buttons.accepted.connect(dialog.accept)
+    buttons.rejected.connect(dialog.reject)
+    layout.addWidget(column_list)
+    layout.addWidget(buttons)
+    if dialog.exec() != QDialog.DialogCode.Accepted:
+        return None
+    return [column_list.item(i).text() for i in range(column_list.count())
+            if column_list.item(i).checkState() == Qt.CheckState.Checked]
+
+
+# runs the export on a worker thread so the ui keeps responding, finished fires back on the qt
+# thread with a message for the user
+class ExportWorker(QObject):
+    finished = pyqtSignal(str)
+
+    def start(self, df, mask, path, columns=None):
+        thread = threading.Thread(target=self.run, args=(df, mask, path, columns), daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, df, mask, path, columns):
+        try:
+            count = export_selection(df, mask, path, columns)
+            self.finished.emit(f"Exported {count:,} rows to {path}")
+        except Exception as e:
+            self.finished.emit(f"Export failed: {e}")
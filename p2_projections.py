@@ -0,0 +1,95 @@
+import numpy as np
+from p2_data import as_float
+
+# derived axes over the numeric columns: the first principal components and a z-score composite
+# (average z-score of each row). everything is done on standardized columns with missing values
+# counted as the column mean (z = 0), so a few NaNs dont throw a whole country out
+PROJECTIONS = ['PC1', 'PC2', 'PC3', 'z-composite']
+
+
+def pair(a, b):
+    return (a, b) if a <= b else (b, a)
+
+
+class Projections:
+    def __init__(self, df, columns):
+        self.df = df
+        self.columns = list(columns)
+        self.stats = {}    # column -> (mean, std) ignoring NaN
+        self.z = {}        # column -> float32 z-scores, NaN as 0
+        self.gram = {}     # (column, column) -> dot product of the standardized columns
+        self.results = {}  # column subset -> {projection name: array}
+
+    def names(self):
+        return PROJECTIONS[:min(3, len(self.columns))] + PROJECTIONS[3:]
+
+    def zscore(self, column):
+        z = self.z.get(column)
+        if z is not None:
+            return z
+        values = as_float(self.df[column])
+        if column not in self.stats:
+            valid = values[~np.isnan(values)]
+            if len(valid) == 0:
+                self.stats[column] = (0.0, 1.0)
+            else:
+                std = valid.std()
+                self.stats[column] = (valid.mean(), std if std > 0 else 1.0)
+        mean, std = self.stats[column]
+        z = np.nan_to_num((values - mean) / std, nan=0.0).astype(np.float32)
+        self.z[column] = z
+        return z
+
+    # projections for a subset of columns (all numeric columns by default), cached per subset
+    # the z-scores and gram matrix entries are cached per column, so only columns we havent seen
+    # (or that changed) get standardized and multiplied again
+    def compute(self, subset=None):
+        subset = tuple(subset or self.columns)
+        cached = self.results.get(subset)
+        if cached is not None:
+            return cached
+        z = [self.zscore(column) for column in subset]
+        for i, a in enumerate(subset):
+            for j, b in enumerate(subset[i:], i):
+                if pair(a, b) not in self.gram:
+                    self.gram[pair(a, b)] = float(np.dot(z[i], z[j]))
+        gram = np.array([[self.gram[pair(a, b)] for b in subset] for a in subset])
+        eigvals, eigvecs = np.linalg.eigh(gram)
+        order = np.argsort(eigvals)[::-1][:3]
+        vecs = eigvecs[:, order]
+        # eigenvectors can come back with either sign, fixing it keeps the axes from flipping on recompute
+        vecs *= np.sign(vecs[np.abs(vecs).argmax(axis=0), np.arange(len(order))])
+        # column by column so the n x p matrix of z-scores is never built
+        scores = np.zeros((len(order), len(self.df)))
+        composite = np.zeros(len(self.df))
+        counts = np.zeros(len(self.df))
+        for i, column in enumerate(subset):
+            scores += vecs[i][:, None] * z[i]
+            composite += z[i]
+            counts += self.df[column].notna().to_numpy()
+        result = {f'PC{k + 1}': scores[k] for k in range(len(order))}
+        result['z-composite'] = composite / np.maximum(counts, 1)
+        self.results[subset] = result
+        return result
+
+    def get(self, name, subset=None):
+        return self.compute(subset)[name]
+
+    # call when the values of some columns changed, the rest of the cached gram matrix is kept
+    def invalidate(self, columns=None):
+        if columns is None:
+            self.stats.clear()
+            self.z.clear()
+            self.gram.clear()
+            self.results.clear()
+            return
+        columns = set(columns)
+        for column in columns:
+            self.stats.pop(column, None)
+            self.z.pop(column, None)
+        self.gram = {key: value for key, value in self.gram.items() if not columns.intersection(key)}
+        self.results = {key: value for key, value in self.results.items() if not columns.intersection(key)}
+
+    def nbytes(self):
+        return (sum(z.nbytes for z in self.z.values())
+                + sum(values.nbytes for result in self.results.values() for values in result.values()))
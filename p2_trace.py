@@ -0,0 +1,104 @@
+import gzip
+import json
+import math
+import time
+import numpy as np
+from matplotlib.backend_bases import MouseButton, MouseEvent
+from PyQt6.QtWidgets import QComboBox, QSlider
+
+# record and replay of interaction traces so hover/brushing slowdowns can be caught without
+# someone dragging the mouse around. a trace is gzipped json lines, first line is a header and
+# every other line is one event: [time ms, kind, target, a, b, button]
+# mouse positions are stored as a fraction of the canvas size so a trace still lines up if the
+# window ends up a bit bigger or smaller when replaying. event.x/y are physical pixels in the qt
+# backend, so the size has to be the physical one too or a retina (dpr 2) trace comes out doubled
+TRACE_VERSION = 1
+FRAME_MS = 1000 / 60
+MOUSE_EVENTS = {'motion': 'motion_notify_event', 'press': 'button_press_event', 'release': 'button_release_event'}
+
+
+class TraceRecorder:
+    # targets maps a name to a canvas, combo box or slider, same dict gets passed to replay_trace
+    def __init__(self, targets):
+        self.start = time.perf_counter()
+        self.events = []
+        for name, target in targets.items():
+            if isinstance(target, QComboBox):
+                target.currentIndexChanged.connect(lambda _, name=name, target=target: self.add('combo', name, target.currentText()))
+            elif isinstance(target, QSlider):
+                target.valueChanged.connect(lambda value, name=name: self.add('slider', name, value))
+            else:
+                for kind, event_name in MOUSE_EVENTS.items():
+                    target.mpl_connect(event_name, lambda event, kind=kind, name=name: self.add_mouse(kind, name, event))
+
+    def add(self, kind, target, a=None, b=None, button=None):
+        self.events.append([round((time.perf_counter() - self.start) * 1000, 2), kind, target, a, b, button])
+
+    def add_mouse(self, kind, target, event):
+        width, height = event.canvas.get_width_height(physical=True)
+        button = int(event.button) if event.button is not None else None
+        self.add(kind, target, round(event.x / width, 5), round(event.y / height, 5), button)
+
+    def save(self, path):
+        with gzip.open(path, 'wt') as f:
+            f.write(json.dumps({'version': TRACE_VERSION, 'events': len(self.events)}) + '\n')
+            for event in self.events:
+                f.write(json.dumps(event, separators=(',', ':')) + '\n')
+        print(f"recorded {len(self.events)} events to {path}")
+
+
+def load_trace(path):
+    with gzip.open(path, 'rt') as f:
+        header = json.loads(f.readline())
+        if header.get('version') != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version {header.get('version')} in '{path}'")
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def dispatch(target, kind, a, b, button):
+    if kind == 'combo':
+        index = target.findText(a)
+        if index < 0:
+            raise ValueError(f"Option '{a}' is not available in this dataset")
+        target.setCurrentIndex(index)
+    elif kind == 'slider':
+        target.setValue(a)
+    else:
+        width, height = target.get_width_height(physical=True)
+        event = MouseEvent(MOUSE_EVENTS[kind], target, a * width, b * height,
+                           button=MouseButton(button) if button is not None else None)
+        target.callbacks.process(event.name, event)
+
+
+# feeds the trace back through the same handlers the gui uses and times each one, including
+# the qt repaint that follows. max_speed=False keeps the recorded gaps between events
+def replay_trace(path, targets, app, max_speed=False):
+    events = load_trace(path)
+    latencies = {}
+    dropped = 0
+    app.processEvents()  # let the window lay out first so canvases have their real size
+    start = time.perf_counter()
+    for t, kind, name, a, b, button in events:
+        if not max_speed:
+            wait = t / 1000 - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+        began = time.perf_counter()
+        dispatch(targets[name], kind, a, b, button)
+        app.processEvents()
+        latency = (time.perf_counter() - began) * 1000
+        latencies.setdefault(kind, []).append(latency)
+        dropped += math.floor(latency / FRAME_MS)  # frames that went by without a fresh paint
+    print_replay_report(latencies, dropped)
+    return 0
+
+
+def print_replay_report(latencies, dropped):
+    print(f"{'event':<10}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  (ms)")
+    everything = [latency for values in latencies.values() for latency in values]
+    for kind, values in list(latencies.items()) + [('all', everything)]:
+        if not values:
+            continue
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        print(f"{kind:<10}{len(values):>8}{p50:>10.2f}{p90:>10.2f}{p99:>10.2f}{max(values):>10.2f}")
+    print(f"dropped frames: {dropped} ({FRAME_MS:.1f} ms frame budget)")
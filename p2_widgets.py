@@ -4,12 +4,20 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from PyQt6.QtWidgets import QApplication, QMainWindow, QComboBox, QLabel, QVBoxLayout, QWidget
 import argparse
+from p2_cache import FrameCache, print_stats
+from p2_data import load_table, PlotData, print_memory_report
+from p2_projections import Projections
+from p2_colors import CategoricalColors
 
 # not hardcoding cli this time(made that mistake last time my bad)
 def parse_args():
     parser = argparse.ArgumentParser(description="Interactive Bubble Chart using CIA Factbook Data")
     parser.add_argument('-i', '--input', type=str, default='/Users/salonijajoo/Downloads/CIA_world_factbook_2023.csv',
                         help='Path to the CSV file containing data')
+    parser.add_argument('--cache-mb', type=float, default=64, help='Memory budget in MB for cached rendered frames')
+    parser.add_argument('--cache-stats', action='store_true', help='Print render cache hits/misses on exit')
+    parser.add_argument('--float32', action='store_true', help='Store float columns as float32 when their values have at most 6 significant digits, saves memory but tooltips and exports show those columns rounded to float32 precision')
+    parser.add_argument('--memory-report', action='store_true', help='Print per-column memory usage and peak RSS on exit')
     return parser.parse_args()
 #global variable to manage the colorbar across updates
 colorbar = None
@@ -18,9 +26,13 @@ colorbar = None
 def main():
     global colorbar
     args = parse_args()
-    df = pd.read_csv(args.input)
-    numeric_columns = df.select_dtypes(include=[float, int]).columns.tolist() #separating numeric columns
+    df = load_table(args.input, float32=args.float32)
+    numeric_columns = df.select_dtypes(include='number').columns.tolist() #separating numeric columns
+    projections = Projections(df, numeric_columns)  #PC1/PC2/PC3/z-composite as extra axis options
+    data = PlotData(df, projections)  #scaled sizes/category codes get built once and reused on every redraw
+    colors = CategoricalColors(data)  #palettes + legends for text columns
     app = QApplication(sys.argv)
+    cache = FrameCache(args.cache_mb)
     #display
     window = QMainWindow()
     window.setWindowTitle('Interactive Bubble Chart')
@@ -30,9 +42,9 @@ def main():
     widget = QWidget()
     layout = QVBoxLayout()
     x_select = QComboBox()
-    x_select.addItems(numeric_columns)
+    x_select.addItems(numeric_columns + projections.names())
     y_select = QComboBox()
-    y_select.addItems(numeric_columns)
+    y_select.addItems(numeric_columns + projections.names())
     color_select = QComboBox()
     color_select.addItems(df.columns)
     size_select = QComboBox()
@@ -89,14 +101,12 @@ def main():
             raise ValueError(f"The selected size attribute '{size_attr}' contains non-numeric data.")
 
         # plots data
-        x = df[x_attr]
-        y = df[y_attr]
+        x = data.raw(x_attr)
+        y = data.raw(y_attr)
         color = df[color_attr]
-        size = pd.to_numeric(df[size_attr])
-        size_scaled = ((size - size.min()) / (size.max() - size.min())) * 1000
+        size_scaled = data.sizes(size_attr, fill=None) * 1000
         if not is_numeric(color_attr):
-            color_codes = pd.Categorical(df[color_attr]).codes
-            scatter = ax.scatter(x, y, s=size_scaled, c=color_codes, cmap='viridis', alpha=0.7, edgecolors='w', linewidth=0.5)
+            scatter = ax.scatter(x, y, s=size_scaled, alpha=0.7, edgecolors='w', linewidth=0.5, **colors.scatter_kwargs(color_attr))
         else:
             scatter = ax.scatter(x, y, s=size_scaled, c=color, cmap='viridis', alpha=0.7, edgecolors='w', linewidth=0.5)
 
@@ -116,9 +126,13 @@ def main():
             # the colorbar kept moving everytime i changed the color variable so i fixed it
             ax.set_position([0.1, 0.1, 0.65, 0.8])
             colorbar = figure.colorbar(scatter, ax=ax, label=color_attr, fraction=0.05, pad=0.04)
+        else:
+            colors.legend(ax, color_attr)  #text columns get a discrete legend instead
         legend(ax, size_attr)
         plt.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.1)
-        canvas.draw() #refreshes canvas
+        #the axes position depends on whether a colorbar was shown before, so it has to be part of the key too
+        layout_key = tuple(round(v, 4) for v in ax.get_position().bounds) + (is_numeric(color_attr),)
+        cache.draw(canvas, cache.key(canvas, x_attr, y_attr, color_attr, size_attr, layout_key)) #refreshes canvas (from cache if seen before)
     update_plot()
 
     #connects signals
@@ -127,7 +141,12 @@ def main():
     color_select.currentIndexChanged.connect(update_plot)
     size_select.currentIndexChanged.connect(update_plot)
     window.show()
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    if args.cache_stats:
+        print_stats(cache)
+    if args.memory_report:
+        print_memory_report(df, data)
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
     main()